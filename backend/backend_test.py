@@ -1,4 +1,5 @@
-import requests
+import asyncio
+import httpx
 import pytest
 from datetime import datetime, timedelta
 import uuid
@@ -10,11 +11,22 @@ class AttendanceAPITester:
         self.tests_run = 0
         self.tests_passed = 0
         self.user_data = None
+        # Reuse pooled keep-alive connections instead of a new TLS handshake per call
+        self.client = httpx.AsyncClient(
+            base_url=self.base_url,
+            http2=True,
+            limits=httpx.Limits(max_connections=10, max_keepalive_connections=10)
+        )
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.client.aclose()
 
-    def run_test(self, name, method, endpoint, expected_status, data=None):
+    async def run_test(self, name, method, endpoint, expected_status, data=None):
         """Run a single API test"""
-        url = f"{self.base_url}/{endpoint}"
-        headers = {'Content-Type': 'application/json'}
+        headers = {}
         if self.token:
             headers['Authorization'] = f'Bearer {self.token}'
 
@@ -22,16 +34,12 @@ class AttendanceAPITester:
         print(f"\n🔍 Testing {name}...")
         
         try:
-            if method == 'GET':
-                response = requests.get(url, headers=headers)
-            elif method == 'POST':
-                if endpoint == 'login':
-                    # For login, use form data
-                    response = requests.post(url, data=data)
-                else:
-                    response = requests.post(url, json=data, headers=headers)
-            elif method == 'PUT':
-                response = requests.put(url, json=data, headers=headers)
+            if method == 'POST' and endpoint == 'login':
+                # For login, use form data
+                response = await self.client.post(endpoint, data=data)
+            else:
+                # json= sets the application/json Content-Type header
+                response = await self.client.request(method, endpoint, json=data, headers=headers)
 
             success = response.status_code == expected_status
             if success:
@@ -50,7 +58,7 @@ class AttendanceAPITester:
             print(f"❌ Failed - Error: {str(e)}")
             return False, {}
 
-    def test_registration(self):
+    async def test_registration(self):
         """Test user registration"""
         test_id = str(uuid.uuid4())[:8]
         self.user_data = {
@@ -63,7 +71,7 @@ class AttendanceAPITester:
             "role": "student"
         }
         
-        success, response = self.run_test(
+        success, response = await self.run_test(
             "User Registration",
             "POST",
             "register",
@@ -72,7 +80,7 @@ class AttendanceAPITester:
         )
         return success
 
-    def test_login(self):
+    async def test_login(self):
         """Test login functionality"""
         if not self.user_data:
             print("❌ No user data available for login test")
@@ -83,7 +91,7 @@ class AttendanceAPITester:
             "password": self.user_data["password"]
         }
         
-        success, response = self.run_test(
+        success, response = await self.run_test(
             "User Login",
             "POST",
             "login",
@@ -96,9 +104,9 @@ class AttendanceAPITester:
             return True
         return False
 
-    def test_get_profile(self):
+    async def test_get_profile(self):
         """Test getting user profile"""
-        success, response = self.run_test(
+        success, response = await self.run_test(
             "Get User Profile",
             "GET",
             "me",
@@ -106,9 +114,9 @@ class AttendanceAPITester:
         )
         return success
 
-    def test_get_subjects(self):
+    async def test_get_subjects(self):
         """Test getting subjects list"""
-        success, response = self.run_test(
+        success, response = await self.run_test(
             "Get Subjects",
             "GET",
             "subjects",
@@ -118,10 +126,10 @@ class AttendanceAPITester:
             print(f"Found {len(response)} subjects")
         return success, response
 
-    def test_attendance_flow(self):
+    async def test_attendance_flow(self):
         """Test complete attendance flow"""
         # First get subjects
-        success, subjects = self.test_get_subjects()
+        success, subjects = await self.test_get_subjects()
         if not success or not subjects:
             print("❌ No subjects available for attendance test")
             return False
@@ -134,7 +142,7 @@ class AttendanceAPITester:
             "status": "present"
         }
 
-        success, response = self.run_test(
+        success, response = await self.run_test(
             "Record Attendance",
             "POST",
             "attendance",
@@ -145,7 +153,7 @@ class AttendanceAPITester:
             return False
 
         # Get attendance summary
-        success, summary = self.run_test(
+        success, summary = await self.run_test(
             "Get Attendance Summary",
             "GET",
             "attendance/summary",
@@ -155,31 +163,153 @@ class AttendanceAPITester:
             print("Attendance Summary:", summary)
         return success
 
-def main():
+async def main():
     # Setup
     base_url = "https://b5676da5-c4fb-4248-ac3b-bb2e570d8678.preview.emergentagent.com/api"
-    tester = AttendanceAPITester(base_url)
+    async with AttendanceAPITester(base_url) as tester:
+        # Run tests
+        if not await tester.test_registration():
+            print("❌ Registration failed, stopping tests")
+            return 1
+
+        if not await tester.test_login():
+            print("❌ Login failed, stopping tests")
+            return 1
+
+        # Profile and subjects are independent, so fetch them concurrently
+        profile_ok, (subjects_ok, _) = await asyncio.gather(
+            tester.test_get_profile(),
+            tester.test_get_subjects()
+        )
+        if not profile_ok:
+            print("❌ Profile retrieval failed")
+            return 1
+
+        if not subjects_ok:
+            print("❌ Subjects retrieval failed")
+            return 1
+
+        if not await tester.test_attendance_flow():
+            print("❌ Attendance flow failed")
+            return 1
+
+        # Print results
+        print(f"\n📊 Tests passed: {tester.tests_passed}/{tester.tests_run}")
+        return 0 if tester.tests_passed == tester.tests_run else 1
+
+# Pytest tests share the session-scoped client and subject from conftest.py,
+# so registration and login happen once per run
+pytestmark = pytest.mark.asyncio(loop_scope="session")
+
+async def test_get_profile(client, user_data):
+    response = await client.get("me")
+    assert response.status_code == 200, response.text
+    assert response.json()["email"] == user_data["email"]
+
+async def test_get_subjects(client, sample_subject_id):
+    response = await client.get("subjects")
+    assert response.status_code == 200, response.text
+    assert sample_subject_id in [subject["id"] for subject in response.json()]
+
+async def test_record_attendance(client, sample_subject_id):
+    response = await client.post("attendance", json={
+        "subject_id": sample_subject_id,
+        "date": datetime.utcnow().isoformat(),
+        "status": "present"
+    })
+    assert response.status_code == 200, response.text
+    assert response.json()["subject_id"] == sample_subject_id
+
+ATTENDANCE_RECORD_FIELDS = {"id", "student_id", "subject_id", "date", "status", "created_at"}
+
+async def test_get_attendance(client, sample_subject_id):
+    # Fixed past dates keep these rows apart from the other tests' records
+    recorded = []
+    for day, attendance_status in ((1, "present"), (2, "absent")):
+        response = await client.post("attendance", json={
+            "subject_id": sample_subject_id,
+            "date": datetime(2024, 2, day, 10).isoformat(),
+            "status": attendance_status
+        })
+        assert response.status_code == 200, response.text
+        recorded.append(response.json())
+
+    window = {
+        "subject_id": sample_subject_id,
+        "start_date": "2024-02-01T00:00:00",
+        "end_date": "2024-02-02T23:59:59"
+    }
+    response = await client.get("attendance", params=window)
+    assert response.status_code == 200, response.text
+    records = response.json()
+    assert isinstance(records, list)
+    assert all(set(record) == ATTENDANCE_RECORD_FIELDS for record in records)
+    assert [(record["id"], record["status"]) for record in records] == [
+        (record["id"], record["status"]) for record in recorded
+    ]
+
+    # Pages follow the date order
+    response = await client.get("attendance", params={**window, "skip": 1, "limit": 1})
+    assert response.status_code == 200, response.text
+    assert [record["id"] for record in response.json()] == [recorded[1]["id"]]
+
+async def test_get_attendance_empty(client):
+    response = await client.get("attendance", params={"subject_id": str(uuid.uuid4())})
+    assert response.status_code == 200, response.text
+    assert response.json() == []
+
+async def test_get_attendance_summary(client, sample_subject_id):
+    # Record one present and one absent class so both counts are non-trivial
+    for day, attendance_status in ((1, "present"), (2, "absent")):
+        response = await client.post("attendance", json={
+            "subject_id": sample_subject_id,
+            "date": datetime(2024, 3, day, 10).isoformat(),
+            "status": attendance_status
+        })
+        assert response.status_code == 200, response.text
 
-    # Run tests
-    if not tester.test_registration():
-        print("❌ Registration failed, stopping tests")
-        return 1
+    # The session user is new, so its records for the subject are the expected counts
+    response = await client.get("attendance", params={"subject_id": sample_subject_id})
+    assert response.status_code == 200, response.text
+    records = response.json()
+    attended = sum(record["status"] == "present" for record in records)
 
-    if not tester.test_login():
-        print("❌ Login failed, stopping tests")
-        return 1
+    response = await client.get("attendance/summary")
+    assert response.status_code == 200, response.text
+    summary = {item["subject_id"]: item for item in response.json()}
+    item = summary[sample_subject_id]
+    assert item["total_classes"] == len(records)
+    assert item["classes_attended"] == attended
+    assert 0 < item["classes_attended"] < item["total_classes"]
+    assert item["attendance_percentage"] == pytest.approx(attended / len(records) * 100)
 
-    if not tester.test_get_profile():
-        print("❌ Profile retrieval failed")
-        return 1
+async def test_record_attendance_once_per_day(client, sample_subject_id):
+    for first, second in (
+        # Same calendar day
+        ("2024-04-01T09:00:00", "2024-04-01T15:00:00"),
+        # Different offsets, both on 2024-04-02 in UTC
+        ("2024-04-01T23:30:00-02:00", "2024-04-02T05:00:00+00:00"),
+    ):
+        response = await client.post("attendance", json={
+            "subject_id": sample_subject_id, "date": first, "status": "present"
+        })
+        assert response.status_code == 200, response.text
 
-    if not tester.test_attendance_flow():
-        print("❌ Attendance flow failed")
-        return 1
+        response = await client.post("attendance", json={
+            "subject_id": sample_subject_id, "date": second, "status": "absent"
+        })
+        assert response.status_code == 400, response.text
+        assert response.json()["detail"] == "Attendance already recorded for this date and subject"
 
-    # Print results
-    print(f"\n📊 Tests passed: {tester.tests_passed}/{tester.tests_run}")
-    return 0 if tester.tests_passed == tester.tests_run else 1
+async def test_record_attendance_batch(client, sample_subject_id):
+    # Repeated days in one batch are recorded once
+    days = [datetime.utcnow() - timedelta(days=offset) for offset in (1, 2, 2)]
+    response = await client.post("attendance/batch", json=[
+        {"subject_id": sample_subject_id, "date": day.isoformat(), "status": "present"}
+        for day in days
+    ])
+    assert response.status_code == 200, response.text
+    assert len(response.json()) == 2
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    asyncio.run(main())
\ No newline at end of file
@@ -0,0 +1,106 @@
+import os
+import uuid
+from pathlib import Path
+import httpx
+import pytest
+import pytest_asyncio
+
+BASE_URL = os.environ.get(
+    "BACKEND_TEST_URL",
+    "https://b5676da5-c4fb-4248-ac3b-bb2e570d8678.preview.emergentagent.com/api"
+)
+# hishel writes a catch-all .gitignore next to the database, so give it its own folder
+HTTP_CACHE_PATH = Path(__file__).parent / ".cache" / "hishel" / "http_cache.sqlite"
+HTTP_CACHE_TTL = 60 * 60 * 12  # 12 hours
+
+def pytest_addoption(parser):
+    parser.addoption(
+        "--use-http-cache",
+        action="store_true",
+        default=bool(os.environ.get("USE_HTTP_CACHE")),
+        help="Serve the subjects list from a local SQLite cache across test runs"
+    )
+
+def cached_transport(transport):
+    """Wrap a transport with a hishel cache limited to the subjects list
+
+    Every session registers a fresh user and hishel keys entries on the URL
+    alone, so user-scoped endpoints (me, attendance) must never be cached.
+    """
+    from hishel import AsyncSqliteStorage, BaseFilter, FilterPolicy
+    from hishel.httpx import AsyncCacheTransport
+
+    class SubjectsRequestFilter(BaseFilter):
+        def needs_body(self):
+            return False
+
+        def apply(self, item, body):
+            return item.method == "GET" and item.url.rstrip("/").endswith("/subjects")
+
+    class NonEmptyResponseFilter(BaseFilter):
+        # An empty list would hide subjects seeded later in the session
+        def needs_body(self):
+            return True
+
+        def apply(self, item, body):
+            return item.status_code == 200 and body != b"[]"
+
+    return AsyncCacheTransport(
+        next_transport=transport,
+        storage=AsyncSqliteStorage(database_path=HTTP_CACHE_PATH, default_ttl=HTTP_CACHE_TTL),
+        policy=FilterPolicy(
+            request_filters=[SubjectsRequestFilter()],
+            response_filters=[NonEmptyResponseFilter()]
+        )
+    )
+
+@pytest.fixture(scope="session")
+def user_data():
+    """Credentials for the student registered once per test session"""
+    test_id = str(uuid.uuid4())[:8]
+    return {
+        "name": f"Test Student {test_id}",
+        "email": f"test{test_id}@example.com",
+        "password": "Test123!",
+        "enrollment_number": f"EN{test_id}",
+        "branch": "Computer Science",
+        "year": 2,
+        "role": "student"
+    }
+
+@pytest_asyncio.fixture(scope="session", loop_scope="session")
+async def client(user_data, pytestconfig):
+    """HTTP client authenticated once and shared by every test"""
+    transport = httpx.AsyncHTTPTransport(
+        http2=True,
+        limits=httpx.Limits(max_connections=10, max_keepalive_connections=10)
+    )
+    if pytestconfig.getoption("--use-http-cache"):
+        transport = cached_transport(transport)
+
+    async with httpx.AsyncClient(base_url=BASE_URL, transport=transport) as client:
+        response = await client.post("register", json=user_data)
+        assert response.status_code == 200, response.text
+
+        # For login, use form data
+        response = await client.post("login", data={
+            "username": user_data["email"],
+            "password": user_data["password"]
+        })
+        assert response.status_code == 200, response.text
+
+        client.headers["Authorization"] = f"Bearer {response.json()['access_token']}"
+        yield client
+
+@pytest_asyncio.fixture(scope="session", loop_scope="session")
+async def sample_subject_id(client):
+    """Id of a subject to record attendance against, seeding sample data if needed"""
+    response = await client.get("subjects")
+    assert response.status_code == 200, response.text
+    subjects = response.json()
+    if not subjects:
+        response = await client.post("sample-data")
+        assert response.status_code == 201, response.text
+        response = await client.get("subjects")
+        subjects = response.json()
+    return subjects[0]["id"]
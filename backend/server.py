@@ -1,17 +1,25 @@
-from fastapi import FastAPI, APIRouter, HTTPException, Depends, status
+from fastapi import FastAPI, APIRouter, HTTPException, Depends, Query, status
+from fastapi.responses import ORJSONResponse, StreamingResponse
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
 from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
+from starlette.middleware.gzip import GZipMiddleware
 from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo.errors import BulkWriteError, DuplicateKeyError
 import os
+import asyncio
 import logging
 from pathlib import Path
-from pydantic import BaseModel, Field, EmailStr
+from contextlib import asynccontextmanager
+from concurrent.futures import ThreadPoolExecutor
+from pydantic import BaseModel, ConfigDict, Field, EmailStr
 from typing import List, Optional, Dict, Any
 import uuid
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
 import jwt
+import orjson
 from passlib.context import CryptContext
+from cachetools import TTLCache
 from enum import Enum
 
 ROOT_DIR = Path(__file__).parent
@@ -19,11 +27,103 @@ load_dotenv(ROOT_DIR / '.env')
 
 # MongoDB connection
 mongo_url = os.environ['MONGO_URL']
-client = AsyncIOMotorClient(mongo_url)
+client = AsyncIOMotorClient(
+    mongo_url,
+    maxPoolSize=50,
+    minPoolSize=10,
+    serverSelectionTimeoutMS=2000,
+    waitQueueTimeoutMS=2000
+)
 db = client[os.environ['DB_NAME']]
 
+async def migrate_attendance():
+    # Backfill the derived fields on records written before they were stored
+    await db.attendance.update_many(
+        {"present": {"$exists": False}},
+        [{"$set": {"present": {"$eq": ["$status", "present"]}}}]
+    )
+    await db.attendance.update_many(
+        {"date_day": {"$exists": False}},
+        [{"$set": {"date_day": {"$dateToString": {"format": "%Y-%m-%d", "date": "$date"}}}}]
+    )
+    
+    # Older records may repeat a day, which would stop the unique index from
+    # building; until it exists, move the extra records aside
+    indexes = await db.attendance.index_information()
+    if "student_id_1_subject_id_1_date_day_1" not in indexes:
+        await archive_duplicate_attendance_days()
+
+async def archive_duplicate_attendance_days():
+    # Keep the earliest record per student, subject and day, and copy every
+    # other one to attendance_duplicates (pointing at the kept record's id)
+    # before removing it, so a later correction can still be restored
+    pipeline = [
+        {"$sort": {"created_at": 1, "_id": 1}},
+        {"$group": {
+            "_id": {
+                "student_id": "$student_id",
+                "subject_id": "$subject_id",
+                "date_day": "$date_day"
+            },
+            "keep": {"$first": "$_id"},
+            "keep_id": {"$first": "$id"},
+            "ids": {"$push": "$_id"},
+            "count": {"$sum": 1}
+        }},
+        {"$match": {"count": {"$gt": 1}}}
+    ]
+    duplicate_of = {}
+    async for group in db.attendance.aggregate(pipeline, allowDiskUse=True):
+        for _id in group["ids"]:
+            if _id != group["keep"]:
+                duplicate_of[_id] = group["keep_id"]
+    
+    if not duplicate_of:
+        return
+    
+    duplicates = await db.attendance.find({"_id": {"$in": list(duplicate_of)}}).to_list(None)
+    try:
+        await db.attendance_duplicates.insert_many([
+            {**doc, "duplicate_of": duplicate_of[doc["_id"]]}
+            for doc in duplicates
+        ], ordered=False)
+    except BulkWriteError as e:
+        # Another worker starting at the same time may have archived some already
+        errors = e.details["writeErrors"]
+        if e.details.get("writeConcernErrors") or any(error["code"] != 11000 for error in errors):
+            raise
+    
+    await db.attendance.delete_many({"_id": {"$in": [doc["_id"] for doc in duplicates]}})
+    logger.warning(
+        "Moved %d duplicate attendance records to attendance_duplicates",
+        len(duplicates)
+    )
+
+async def create_indexes():
+    await db.attendance.create_index([("student_id", 1), ("subject_id", 1), ("date", 1)])
+    await db.attendance.create_index([("student_id", 1), ("subject_id", 1), ("present", 1)])
+    await db.attendance.create_index(
+        [("student_id", 1), ("subject_id", 1), ("date_day", 1)], unique=True
+    )
+    await db.users.create_index("email", unique=True)
+    await db.users.create_index("id", unique=True)
+    await db.subjects.create_index("id", unique=True)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Bound the pool used for password hashing to the number of cores
+    asyncio.get_running_loop().set_default_executor(
+        ThreadPoolExecutor(max_workers=os.cpu_count())
+    )
+    # Force server selection so the connection pool is warm before traffic
+    await client.admin.command("ping")
+    await migrate_attendance()
+    await create_indexes()
+    yield
+    client.close()
+
 # Create the main app without a prefix
-app = FastAPI()
+app = FastAPI(lifespan=lifespan, default_response_class=ORJSONResponse)
 
 # Create a router with the /api prefix
 api_router = APIRouter(prefix="/api")
@@ -31,11 +131,17 @@ api_router = APIRouter(prefix="/api")
 # Authentication setup
 SECRET_KEY = os.environ.get("SECRET_KEY", "defaultsecretkey")
 ALGORITHM = "HS256"
+# Resolved once so encode/decode don't rebuild them on every request
+SECRET_KEY_BYTES = SECRET_KEY.encode("utf-8")
+ALGORITHMS = [ALGORITHM]
 ACCESS_TOKEN_EXPIRE_MINUTES = 60 * 24  # 1 day
 
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/login")
 
+# Authenticated users keyed by id, so repeat requests skip the users lookup
+user_cache = TTLCache(maxsize=10000, ttl=60)
+
 # Define Models
 class UserRole(str, Enum):
     STUDENT = "student"
@@ -51,21 +157,23 @@ class Token(BaseModel):
 
 class UserBase(BaseModel):
     name: str
-    email: EmailStr
+    email: str
     enrollment_number: Optional[str] = None
     branch: Optional[str] = None
     year: Optional[int] = None
     role: UserRole = UserRole.STUDENT
 
 class UserCreate(UserBase):
+    # Only user-supplied input needs full email validation
+    email: EmailStr
     password: str
 
 class User(UserBase):
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
     created_at: datetime = Field(default_factory=datetime.utcnow)
 
-    class Config:
-        schema_extra = {
+    model_config = ConfigDict(
+        json_schema_extra={
             "example": {
                 "id": "123e4567-e89b-12d3-a456-426614174000",
                 "name": "John Doe",
@@ -77,6 +185,7 @@ class User(UserBase):
                 "created_at": "2023-01-01T00:00:00"
             }
         }
+    )
 
 class UserInDB(User):
     hashed_password: str
@@ -110,6 +219,10 @@ class AttendanceCreate(BaseModel):
     date: datetime
     status: AttendanceStatus
 
+class AttendanceBatchItem(AttendanceCreate):
+    # Defaults to the current user; teachers and admins may record for others
+    student_id: Optional[str] = None
+
 class AttendanceUpdate(BaseModel):
     status: AttendanceStatus
 
@@ -121,23 +234,35 @@ class AttendanceSummary(BaseModel):
     classes_attended: int
     attendance_percentage: float
 
+# Only fetch the fields the response models need; _id is never returned
+SUBJECT_PROJECTION = {"_id": 0}
+ATTENDANCE_RECORD_PROJECTION = {"_id": 0, **{field: 1 for field in AttendanceRecord.model_fields}}
+
+def attendance_day(date: datetime) -> str:
+    # Mongo stores dates in UTC (naive values are taken as UTC), so derive the
+    # day in UTC to match the stored date and the migration backfill
+    if date.tzinfo is not None:
+        date = date.astimezone(timezone.utc)
+    return date.date().isoformat()
+
 # Authentication functions
-def verify_password(plain_password, hashed_password):
-    return pwd_context.verify(plain_password, hashed_password)
+# bcrypt is CPU-bound, so hashing runs in the default executor to keep the event loop free
+async def verify_password(plain_password, hashed_password):
+    return await asyncio.to_thread(pwd_context.verify, plain_password, hashed_password)
 
-def get_password_hash(password):
-    return pwd_context.hash(password)
+async def get_password_hash(password):
+    return await asyncio.to_thread(pwd_context.hash, password)
 
 async def get_user(email: str):
     user = await db.users.find_one({"email": email})
     if user:
-        return UserInDB(**user)
+        return UserInDB.model_validate(user)
 
 async def authenticate_user(email: str, password: str):
     user = await get_user(email)
     if not user:
         return False
-    if not verify_password(password, user.hashed_password):
+    if not await verify_password(password, user.hashed_password):
         return False
     return user
 
@@ -148,7 +273,7 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     else:
         expire = datetime.utcnow() + timedelta(minutes=15)
     to_encode.update({"exp": expire})
-    encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
+    encoded_jwt = jwt.encode(to_encode, SECRET_KEY_BYTES, algorithm=ALGORITHM)
     return encoded_jwt
 
 async def get_current_user(token: str = Depends(oauth2_scheme)):
@@ -158,40 +283,45 @@ async def get_current_user(token: str = Depends(oauth2_scheme)):
         headers={"WWW-Authenticate": "Bearer"},
     )
     try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+        payload = jwt.decode(token, SECRET_KEY_BYTES, algorithms=ALGORITHMS)
         user_id: str = payload.get("sub")
         if user_id is None:
             raise credentials_exception
         token_data = TokenData(id=user_id)
     except jwt.PyJWTError:
         raise credentials_exception
-    user = await db.users.find_one({"id": token_data.id})
-    if user is None:
+    user = user_cache.get(token_data.id)
+    if user is not None:
+        return user
+    user_doc = await db.users.find_one({"id": token_data.id})
+    if user_doc is None:
         raise credentials_exception
-    return User(**user)
+    user = User.model_validate(user_doc)
+    user_cache[token_data.id] = user
+    return user
 
 # Auth routes
 @api_router.post("/register", response_model=User)
 async def register_user(user: UserCreate):
-    # Check if user already exists
-    db_user = await db.users.find_one({"email": user.email})
-    if db_user:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Email already registered"
-        )
-    
     # Create new user
-    hashed_password = get_password_hash(user.password)
-    user_data = user.dict()
+    hashed_password = await get_password_hash(user.password)
+    user_data = user.model_dump()
     del user_data["password"]
     
     new_user = UserInDB(**user_data, hashed_password=hashed_password)
-    new_user_dict = new_user.dict()
+    user_doc = new_user.model_dump(exclude={"hashed_password"})
     
-    await db.users.insert_one(new_user_dict)
+    # The unique email index rejects duplicate registrations atomically
+    try:
+        await db.users.insert_one({**user_doc, "hashed_password": hashed_password})
+    except DuplicateKeyError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Email already registered"
+        )
     
-    return User(**user_data)
+    # Return the dumped document as is rather than serializing the model again
+    return ORJSONResponse(user_doc)
 
 @api_router.post("/login", response_model=Token)
 async def login(form_data: OAuth2PasswordRequestForm = Depends()):
@@ -223,15 +353,18 @@ async def create_subject(subject: SubjectCreate, current_user: User = Depends(ge
             detail="Not authorized to create subjects"
         )
     
-    new_subject = Subject(**subject.dict())
-    await db.subjects.insert_one(new_subject.dict())
+    subject_doc = Subject(**subject.model_dump()).model_dump()
+    # insert_one adds _id to the document it is given, so pass a copy
+    await db.subjects.insert_one({**subject_doc})
     
-    return new_subject
+    # Return the dumped document as is rather than serializing the model again
+    return ORJSONResponse(subject_doc)
 
 @api_router.get("/subjects", response_model=List[Subject])
 async def get_subjects(current_user: User = Depends(get_current_user)):
-    subjects = await db.subjects.find().to_list(1000)
-    return [Subject(**subject) for subject in subjects]
+    subjects = await db.subjects.find({}, SUBJECT_PROJECTION).to_list(1000)
+    # Documents were validated on write, so skip re-validating them here
+    return [Subject.model_construct(**subject) for subject in subjects]
 
 # Attendance routes
 @api_router.post("/attendance", response_model=AttendanceRecord)
@@ -247,33 +380,101 @@ async def record_attendance(
             detail="Subject not found"
         )
     
-    # Check if attendance already recorded for this date and subject
-    existing = await db.attendance.find_one({
-        "student_id": current_user.id,
-        "subject_id": attendance.subject_id,
-        "date": {
-            "$gte": attendance.date.replace(hour=0, minute=0, second=0),
-            "$lt": attendance.date.replace(hour=23, minute=59, second=59)
-        }
-    })
+    # Create attendance record
+    record = AttendanceRecord(
+        student_id=current_user.id,
+        subject_id=attendance.subject_id,
+        date=attendance.date,
+        status=attendance.status
+    ).model_dump()
     
-    if existing:
+    # Store the status as a boolean too so summaries can sum it directly, and
+    # the calendar day so the unique index rejects a second record that day
+    try:
+        await db.attendance.insert_one({
+            **record,
+            "present": attendance.status == AttendanceStatus.PRESENT,
+            "date_day": attendance_day(attendance.date)
+        })
+    except DuplicateKeyError:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Attendance already recorded for this date and subject"
         )
     
-    # Create attendance record
-    new_attendance = AttendanceRecord(
-        student_id=current_user.id,
-        subject_id=attendance.subject_id,
-        date=attendance.date,
-        status=attendance.status
-    )
+    # Return the dumped document as is rather than serializing the model again
+    return ORJSONResponse(record)
+
+@api_router.post("/attendance/batch", response_model=List[AttendanceRecord])
+async def record_attendance_batch(
+    attendances: List[AttendanceBatchItem],
+    current_user: User = Depends(get_current_user)
+):
+    if not attendances:
+        return ORJSONResponse([])
     
-    await db.attendance.insert_one(new_attendance.dict())
+    # Check if user is recording only their own attendance or is admin/teacher
+    if current_user.role == UserRole.STUDENT and any(
+        item.student_id not in (None, current_user.id) for item in attendances
+    ):
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Not authorized to record attendance for other students"
+        )
     
-    return new_attendance
+    # Check all subjects exist with a single query
+    subject_ids = list({item.subject_id for item in attendances})
+    subjects = await db.subjects.find({"id": {"$in": subject_ids}}, {"_id": 1}).to_list(None)
+    if len(subjects) != len(subject_ids):
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Subject not found"
+        )
+    
+    # Create attendance records, keeping the first entry per student, subject and day
+    records = {}
+    for item in attendances:
+        record = AttendanceRecord(
+            student_id=item.student_id or current_user.id,
+            subject_id=item.subject_id,
+            date=item.date,
+            status=item.status
+        ).model_dump()
+        key = (record["student_id"], record["subject_id"], attendance_day(item.date))
+        records.setdefault(key, record)
+    
+    # Skip records already stored, found with one query instead of one per row
+    existing = await db.attendance.find({
+        "student_id": {"$in": list({student_id for student_id, _, _ in records})},
+        "subject_id": {"$in": subject_ids},
+        "date_day": {"$in": list({date_day for _, _, date_day in records})}
+    }, {"_id": 0, "student_id": 1, "subject_id": 1, "date_day": 1}).to_list(None)
+    for doc in existing:
+        records.pop((doc["student_id"], doc["subject_id"], doc["date_day"]), None)
+    
+    if not records:
+        return ORJSONResponse([])
+    
+    new_records = list(records.values())
+    try:
+        await db.attendance.insert_many([
+            {
+                **record,
+                "present": record["status"] == AttendanceStatus.PRESENT,
+                "date_day": date_day
+            }
+            for (_, _, date_day), record in records.items()
+        ], ordered=False)
+    except BulkWriteError as e:
+        # Rows recorded concurrently since the check above hit the unique
+        # index; leave them out of the response and surface anything else
+        errors = e.details["writeErrors"]
+        if e.details["writeConcernErrors"] or any(error["code"] != 11000 for error in errors):
+            raise
+        duplicates = {error["index"] for error in errors}
+        new_records = [record for i, record in enumerate(new_records) if i not in duplicates]
+    
+    return ORJSONResponse(new_records)
 
 @api_router.put("/attendance/{attendance_id}", response_model=AttendanceRecord)
 async def update_attendance(
@@ -299,20 +500,25 @@ async def update_attendance(
     # Update attendance
     await db.attendance.update_one(
         {"id": attendance_id},
-        {"$set": {"status": attendance_update.status}}
+        {"$set": {
+            "status": attendance_update.status,
+            "present": attendance_update.status == AttendanceStatus.PRESENT
+        }}
     )
     
     # Get updated record
     updated = await db.attendance.find_one({"id": attendance_id})
     
-    return AttendanceRecord(**updated)
+    return AttendanceRecord.model_validate(updated)
 
 @api_router.get("/attendance", response_model=List[AttendanceRecord])
 async def get_attendance(
     current_user: User = Depends(get_current_user),
     subject_id: Optional[str] = None,
     start_date: Optional[datetime] = None,
-    end_date: Optional[datetime] = None
+    end_date: Optional[datetime] = None,
+    skip: int = Query(0, ge=0),
+    limit: int = Query(1000, ge=1, le=1000)
 ):
     # Build query
     query = {"student_id": current_user.id}
@@ -328,32 +534,65 @@ async def get_attendance(
             query["date"]["$lte"] = end_date
     
     # Get attendance records
-    records = await db.attendance.find(query).to_list(1000)
+    # Sort on a unique key so skip/limit pages are stable between requests
+    cursor = (
+        db.attendance.find(query, ATTENDANCE_RECORD_PROJECTION)
+        .sort([("date", 1), ("id", 1)])
+        .skip(skip)
+        .limit(limit)
+    )
     
-    return [AttendanceRecord(**record) for record in records]
+    # Encode records as the cursor yields them instead of buffering the whole
+    # list; the projection already matches the AttendanceRecord fields
+    async def stream_records():
+        separator = b"["
+        async for record in cursor:
+            yield separator + orjson.dumps(record)
+            separator = b","
+        yield b"[]" if separator == b"[" else b"]"
+    
+    return StreamingResponse(stream_records(), media_type="application/json")
 
 @api_router.get("/attendance/summary", response_model=List[AttendanceSummary])
 async def get_attendance_summary(
     current_user: User = Depends(get_current_user)
 ):
-    # Get all subjects
-    subjects = await db.subjects.find().to_list(1000)
+    # Count total and attended classes per subject in a single round-trip,
+    # keeping subjects that have no attendance recorded yet
+    pipeline = [
+        {"$project": {"_id": 0, "id": 1, "name": 1, "code": 1}},
+        {"$lookup": {
+            "from": "attendance",
+            "let": {"subject_id": "$id"},
+            "pipeline": [
+                {"$match": {
+                    "student_id": current_user.id,
+                    "$expr": {"$eq": ["$subject_id", "$$subject_id"]}
+                }},
+                {"$group": {
+                    "_id": None,
+                    "total_classes": {"$sum": 1},
+                    "classes_attended": {"$sum": {"$toInt": "$present"}}
+                }}
+            ],
+            "as": "counts"
+        }},
+        {"$unwind": {"path": "$counts", "preserveNullAndEmptyArrays": True}},
+        {"$project": {
+            "id": 1,
+            "name": 1,
+            "code": 1,
+            "total_classes": {"$ifNull": ["$counts.total_classes", 0]},
+            "classes_attended": {"$ifNull": ["$counts.classes_attended", 0]}
+        }}
+    ]
+    rows = await db.subjects.aggregate(pipeline).to_list(None)
     
     result = []
     
-    for subject in subjects:
-        # Count total classes for this subject
-        total_classes = await db.attendance.count_documents({
-            "student_id": current_user.id,
-            "subject_id": subject["id"]
-        })
-        
-        # Count classes attended
-        classes_attended = await db.attendance.count_documents({
-            "student_id": current_user.id,
-            "subject_id": subject["id"],
-            "status": "present"
-        })
+    for row in rows:
+        total_classes = row["total_classes"]
+        classes_attended = row["classes_attended"]
         
         # Calculate percentage
         percentage = 0
@@ -362,9 +601,9 @@ async def get_attendance_summary(
         
         # Add to result
         result.append(AttendanceSummary(
-            subject_id=subject["id"],
-            subject_name=subject["name"],
-            subject_code=subject["code"],
+            subject_id=row["id"],
+            subject_name=row["name"],
+            subject_code=row["code"],
             total_classes=total_classes,
             classes_attended=classes_attended,
             attendance_percentage=percentage
@@ -384,20 +623,18 @@ async def create_sample_data():
         {"name": "English", "code": "ENG101", "description": "English literature"}
     ]
     
-    for subject_data in subjects:
-        subject = Subject(
-            id=str(uuid.uuid4()),
-            name=subject_data["name"],
-            code=subject_data["code"],
-            description=subject_data["description"]
-        )
-        await db.subjects.insert_one(subject.dict())
+    # Insert all subjects in a single bulk write
+    docs = [Subject(**subject_data).model_dump() for subject_data in subjects]
+    await db.subjects.insert_many(docs, ordered=False)
     
     return {"message": "Sample data created successfully"}
 
 # Include the router in the main app
 app.include_router(api_router)
 
+# Compress larger responses such as the subject and attendance lists
+app.add_middleware(GZipMiddleware, minimum_size=500)
+
 app.add_middleware(
     CORSMiddleware,
     allow_credentials=True,
@@ -412,7 +649,3 @@ logging.basicConfig(
     format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
 )
 logger = logging.getLogger(__name__)
-
-@app.on_event("shutdown")
-async def shutdown_db_client():
-    client.close()